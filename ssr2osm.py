@@ -13,23 +13,39 @@ Parameters:
 - Optional: "-nobuilding" will skip test for overlap with buildings
 - Optional: "-extra" will save extra information tags
 - Optional: "-allpoints" will include all available coordinates for rivers and streams
+- Optional: "-parallel" will convert municipalities in up to 4 parallel processes for "Norge" (one download in progress per process, so up to 4 simultaneous downloads)
+- Optional: "-pretty" will save indented geojson instead of one feature per line
 '''
 
 
 import json
-import copy
 import sys
 import time
 import math
 import random
-import os.path
-import urllib.request, urllib.parse
+import os
+import urllib.request, urllib.parse, urllib.error
+import http.client
+import base64
+import threading
 import zipfile
-from io import BytesIO, TextIOWrapper
+import tempfile
+import shutil
+import concurrent.futures
+import multiprocessing
+import functools
+import contextlib
+from io import StringIO
 from xml.etree import ElementTree as ET
 from itertools import chain
+from operator import itemgetter
 import utm
 
+try:
+	import orjson  # Optional, faster output of geojson files
+except ImportError:
+	orjson = None
+
 
 version = "1.3.1"
 
@@ -67,6 +83,16 @@ language_codes = {
 	'nld': 'nl',   # Nederlandsk
 }
 
+name_tag_types = ("name", "alt_name", "loc_name", "old_name")  # In order of output
+
+NAME, ALT_NAME, LOC_NAME, OLD_NAME = range(4)  # Index of each name tag type in list of spellings per language
+
+place_order = ['locality', 'square', 'isolated_dwelling', 'farm', 'neighbourhood', 'hamlet', 'quarter', 'suburb', 'village', 'town', 'city']
+
+place_rank = { place: rank for rank, place in enumerate(place_order) }  # Index of each place type in place_order
+
+radians_per_degree = math.pi / 180.0  # Same factor as used by math.radians()
+
 building_folder = "~/Jottacloud/osm/bygninger/"  # Folder containing import building files (default folder tried first)
 
 include_incomplete_names = False  # True will include unofficial names, i.e. without name=* present, plus names without object tagging
@@ -79,10 +105,28 @@ avoid_building = True  # True will relocated place nodes if inside (import) buil
 
 less_tags = True  # True to avoid extra information tags (SORTERING etc)
 
+pretty_output = False  # True will save indented geojson, False saves compact geojson with one feature per line
+
 duplicate_tolerance = 500  # Max. meter distance for identifying duplicate names
 
 relocate_tolerance = 50  # Max. meter distance for flagging relocated node (away from building)
 
+download_threads = 4  # Number of municipalities to download in advance when processing "Norge"
+
+parallel_processes = 1  # Number of municipalities to convert in parallel when processing "Norge" (set by "-parallel")
+
+max_parallel_processes = 4  # Max. number of parallel processes, to avoid flooding Kartverket with downloads
+
+connection_pool = threading.local()  # Open http connections, per thread
+
+download_timeout = 120  # Seconds to wait for server before a download fails
+
+max_redirects = 5  # Max. number of redirects to follow for one download
+
+cache_folder = "~/.cache/ssr2osm/"  # Folder for cached municipality list, tagging and N50/N100 visibility
+
+cache_time = 24 * 3600  # Seconds before cached files are downloaded again
+
 
 
 def message (output_text):
@@ -119,9 +163,8 @@ def average_point(coordinates):
 
 		# Average of polygon boundary
 		if length > 1 and coordinates[0] == coordinates[-1]:
-			avg_lon = sum([node[0] for node in coordinates[:-1]]) / (length - 1)
-			avg_lat = sum([node[1] for node in coordinates[:-1]]) / (length - 1)
-			return ( avg_lon, avg_lat )
+			nodes = coordinates[:-1]
+			return ( sum(map(itemgetter(0), nodes)) / (length - 1), sum(map(itemgetter(1), nodes)) / (length - 1) )
 
 		# Midpoint of line
 		else:
@@ -143,7 +186,11 @@ def compute_distance (point1, point2):
 	Works for short distances.
 	'''
 
-	lon1, lat1, lon2, lat2 = map(math.radians, [point1[0], point1[1], point2[0], point2[1]])
+	lon1 = point1[0] * radians_per_degree
+	lat1 = point1[1] * radians_per_degree
+	lon2 = point2[0] * radians_per_degree
+	lat2 = point2[1] * radians_per_degree
+
 	x = (lon2 - lon1) * math.cos( 0.5*(lat2+lat1) )
 	y = lat2 - lat1
 	return 6371000.0 * math.sqrt( x*x + y*y )  # Metres
@@ -158,19 +205,13 @@ def inside_polygon (point, polygon):
 
 	if polygon[0] == polygon[-1]:
 		x, y = point
-		n = len(polygon)
 		inside = False
 
 		p1x, p1y = polygon[0]
-		for i in range(n):
-			p2x, p2y = polygon[i]
-			if y > min(p1y, p2y):
-				if y <= max(p1y, p2y):
-					if x <= max(p1x, p2x):
-						if p1y != p2y:
-							xints = (y-p1y) * (p2x-p1x) / (p2y-p1y) + p1x
-						if p1x == p2x or x <= xints:
-							inside = not inside
+		for p2x, p2y in polygon:
+			if (p1y < y) != (p2y < y) and (x <= p1x or x <= p2x):  # Edge crosses ray
+				if p1x == p2x or x <= (y-p1y) * (p2x-p1x) / (p2y-p1y) + p1x:
+					inside = not inside
 			p1x, p1y = p2x, p2y
 
 		return inside
@@ -195,25 +236,92 @@ def coordinate_offset (node, distance):
 
 
 
+def avoid_overlap(coordinate, points, step):
+	'''
+	Round coordinate to 7 decimals and move it slightly north (step in degrees) until it does not overlap with previous points.
+	Points are kept as integer units of 1e-7 degrees, which are exact and faster to round and hash than floats.
+	The points dict contains all previous points, and for each a point further north in the same cluster of
+	overlapping points. Pointers are followed and then updated to the new point (as in union-find),
+	so that the same cluster is not traversed again. A plain per-point counter is not used, because a point moved
+	north may land on another existing point.
+	'''
+
+	point = ( round(coordinate[0] * 10000000), round(coordinate[1] * 10000000) )
+
+	new_point = points.get(point)
+	if new_point is not None:
+		step = round(step * 10000000)
+		visited = [ point ]
+		while new_point in points:
+			visited.append(new_point)
+			next_point = points[ new_point ]
+			if next_point == new_point:  # Last point of cluster so far
+				next_point = ( new_point[0], new_point[1] + step )
+			new_point = next_point
+		for visited_point in visited:
+			points[ visited_point ] = new_point
+		point = new_point
+
+	points[ point ] = point
+	return ( point[0] / 10000000, point[1] / 10000000 )
+
+
+
 def parse_coordinates(wkt):
 	'''
 	Parse WKT string into list of (lon, lat) coordinate tuples.
 	Convert from UTM 33N.
 	'''
 
-	split_wkt = wkt.split()
-	coordinates = []
-	for i in range(0, len(split_wkt) - 1, 2):
-		x = float(split_wkt[ i ])
-		y = float(split_wkt[ i + 1 ])
-		if use_wfs:
-			node = (x, y)  # 4326
-		else:
-			lat, lon = utm.UtmToLatLon (x, y, 33, "N")
-			node = (lon, lat)
-		coordinates.append(node)
+	values = list(map(float, wkt.split()))  # Convert all numbers in one pass
+	pairs = zip(values[0::2], values[1::2])
+
+	if use_wfs:
+		return list(pairs)  # 4326
+
+	return utm.UtmListToLonLat(pairs, 33, "N")  # Convert all points in one call
+
+
+
+def iterate_features(file, feature_tag):
+	'''
+	Iterate features in xml file while parsing, without building the full tree.
+	Each feature is cleared after it has been processed to release memory.
+	'''
+
+	for event, element in ET.iterparse(file, events=("end",)):
+		if element.tag == feature_tag:
+			yield element
+			element.clear()
+
+
+
+def qualified_tags(ns, paths):
+	'''
+	Build dict of xml paths with fully qualified tags, e.g. "{namespace}navn" for "app:navn".
+	Fully qualified tags avoid resolving the namespace prefix at every find().
+	Key is the last tag of each path.
+	'''
+
+	tags = {}
+	for path in paths:
+		steps = []
+		for step in path.split("/"):
+			prefix, name = step.split(":")
+			steps.append("{%s}%s" % (ns[ prefix ], name))
+		tags[ name ] = "/".join(steps)
+
+	return tags
+
+
 
-	return coordinates
+def fix_spaces(text):
+	'''
+	Remove leading, trailing and repeated spaces (also tabs and line breaks).
+	Split/join is faster than a precompiled regular expression for short place names.
+	'''
+
+	return " ".join(text.split())
 
 
 
@@ -227,6 +335,293 @@ def clean_filename(filename):
 
 
 
+def get_filename(municipality_id, product):
+	'''
+	Return Kartverket filename (without extension) and url for downloading product for municipality.
+	Product is "Stedsnavn", "N50Kartdata" or "N100Kartdata".
+	'''
+
+	filename = clean_filename("Basisdata_%s_%s_25833_%s_GML" % (municipality_id, municipalities[ municipality_id ], product))
+	url = "https://nedlasting.geonorge.no/geonorge/Basisdata/%s/GML/%s.zip" % (product, filename)
+
+	return filename, url
+
+
+
+def get_proxy(scheme, host):
+	'''
+	Return proxy url for scheme from environment (http_proxy, https_proxy), or None if no proxy or host is in no_proxy.
+	'''
+
+	proxy = urllib.request.getproxies().get(scheme)
+	if proxy and not urllib.request.proxy_bypass(host):
+		if "://" not in proxy:
+			proxy = "http://" + proxy
+		return proxy
+	else:
+		return None
+
+
+
+def get_connection(scheme, host):
+	'''
+	Return open http connection to host for current thread, whether requests should use the full url (http proxy),
+	and the request headers to use (including proxy credentials for http proxy).
+	Connections are kept alive and reused to avoid a new TCP/TLS handshake for each download.
+	https is tunneled through proxy, if any.
+	'''
+
+	if not hasattr(connection_pool, "connections"):
+		connection_pool.connections = {}
+
+	if (scheme, host) not in connection_pool.connections:
+		proxy = get_proxy(scheme, host)
+		if proxy:
+			proxy_parts = urllib.parse.urlsplit(proxy)
+			proxy_header = {}
+			if proxy_parts.username:
+				credentials = "%s:%s" % (urllib.parse.unquote(proxy_parts.username), urllib.parse.unquote(proxy_parts.password or ""))
+				proxy_header['Proxy-Authorization'] = "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+			proxy_host = proxy_parts.hostname
+			if proxy_parts.port:
+				proxy_host += ":%i" % proxy_parts.port
+
+			if scheme == "https":
+				connection = http.client.HTTPSConnection(proxy_host, timeout=download_timeout)
+				connection.set_tunnel(host, headers=proxy_header)
+				full_url = False
+				request_header = header
+			else:
+				connection = http.client.HTTPConnection(proxy_host, timeout=download_timeout)
+				full_url = True
+				request_header = dict(header, **proxy_header)  # Credentials are sent to proxy with each request
+
+		else:
+			if scheme == "https":
+				connection = http.client.HTTPSConnection(host, timeout=download_timeout)
+			else:
+				connection = http.client.HTTPConnection(host, timeout=download_timeout)
+			full_url = False
+			request_header = header
+
+		connection_pool.connections[ (scheme, host) ] = (connection, full_url, request_header)
+
+	return connection_pool.connections[ (scheme, host) ]
+
+
+
+def request_url(url):
+	'''
+	Send GET request and return response, following redirects.
+	The response must be read completely before the next request to the same host.
+	'''
+
+	for redirect in range(max_redirects + 1):
+		parts = urllib.parse.urlsplit(url)
+		connection, full_url, request_header = get_connection(parts.scheme, parts.netloc)
+
+		if full_url:
+			path = url
+		else:
+			path = parts.path
+			if parts.query:
+				path += "?" + parts.query
+
+		for attempt in range(2):
+			try:
+				connection.request("GET", path, headers=request_header)
+				response = connection.getresponse()
+				break
+			except (http.client.HTTPException, ConnectionError):
+				connection.close()  # Server may have closed idle connection; reconnect once
+				if attempt > 0:
+					raise
+
+		if response.status in [301, 302, 303, 307, 308]:
+			response.read()
+			url = urllib.parse.urljoin(url, response.getheader("Location"))
+			continue
+
+		if response.status != 200:
+			response.read()
+			raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+		return response
+
+	raise urllib.error.HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+
+
+def get_wfs_query(municipality_id):
+	'''
+	Return filter value and url for SSR wfs query by name type, municipality or county.
+	'''
+
+	ns_app = 'http://skjema.geonorge.no/SOSI/produktspesifikasjon/Stedsnavn/5.0'
+
+	if type_filter:
+		filter_parameter = ("app:navneobjekttype", type_filter)
+	elif len(municipality_id) == 4: 
+		filter_parameter = ("app:kommune/app:Kommune/app:kommunenummer", municipality_id)
+	else:
+		filter_parameter = ("app:kommune/app:Kommune/app:fylkesnummer", municipality_id)
+
+	wfs_filter = '<Filter><PropertyIsEqualTo><ValueReference xmlns:app="%s">%s</ValueReference>' % (ns_app, filter_parameter[0]) + \
+					'<Literal>%s</Literal></PropertyIsEqualTo></Filter>' % filter_parameter[1]
+
+	url = "http://wfs.geonorge.no/skwms1/wfs.stedsnavn50?" + \
+			"VERSION=2.0.0&SERVICE=WFS&srsName=EPSG:4326&REQUEST=GetFeature&TYPENAME=Sted&resultType=results&Filter="
+
+	return filter_parameter[1], url + urllib.parse.quote(wfs_filter)
+
+
+
+def download(url):
+	'''
+	Download file and return content.
+	'''
+
+	return request_url(url).read()
+
+
+
+def download_file(url):
+	'''
+	Download file into temporary file, which is kept in memory unless it is large.
+	Returns the temporary file, positioned at start.
+	'''
+
+	response = request_url(url)
+	file = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)  # Larger files are moved to disk
+	shutil.copyfileobj(response, file, 1024 * 1024)
+	file.seek(0)
+
+	return file
+
+
+
+def decode_json(data):
+	'''
+	Decode json bytes, using the faster orjson parser if installed.
+	'''
+
+	if orjson:
+		return orjson.loads(data)
+	else:
+		return json.loads(data)
+
+
+
+def get_cache_path(cache_filename):
+	'''
+	Return path of file in cache folder, and whether it was saved recently.
+	'''
+
+	cache_path = os.path.join(os.path.expanduser(cache_folder), cache_filename)
+	recent = os.path.isfile(cache_path) and time.time() - os.path.getmtime(cache_path) < cache_time
+
+	return cache_path, recent
+
+
+
+def save_cache(cache_path, data):
+	'''
+	Save data (bytes) to file in cache folder.
+	Write to temporary file first, so that an interrupted run never leaves a partial cache file.
+	'''
+
+	os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+	temp_path = cache_path + ".%i.tmp" % os.getpid()
+	with open(temp_path, "wb") as file:
+		file.write(data)
+	os.replace(temp_path, cache_path)
+
+
+
+def load_cached_json(url, cache_filename):
+	'''
+	Load json file from url, or from cache folder if downloaded recently.
+	Falls back to older cached file if download fails.
+	'''
+
+	cache_path, recent = get_cache_path(cache_filename)
+
+	if recent:
+		with open(cache_path, "rb") as file:
+			return decode_json(file.read())
+
+	try:
+		data = download(url)
+	except (OSError, http.client.HTTPException):
+		if not os.path.isfile(cache_path):
+			raise
+		message ("*** Could not load '%s', using cached file\n" % url)
+		with open(cache_path, "rb") as file:
+			return decode_json(file.read())
+
+	save_cache(cache_path, data)
+
+	return decode_json(data)
+
+
+
+def load_zip(url):
+	'''
+	Load zip file from Kartverket.
+	Use download already started in the background by prefetch(), if any.
+	'''
+
+	if url in downloads:
+		file = downloads.pop(url).result()
+	else:
+		file = download_file(url)
+
+	return zipfile.ZipFile(file)
+
+
+
+def prefetch(executor, municipality_id):
+	'''
+	Start background download of Kartverket files or wfs query needed for municipality or county.
+	'''
+
+	urls = []
+	for product in ["N50Kartdata", "N100Kartdata", "Stedsnavn"]:
+		if product == "N50Kartdata" and len(municipality_id) == 2:  # No N50 for counties
+			continue
+		if product != "Stedsnavn":
+			cache_path, recent = get_cache_path(visibility_cache_filename(municipality_id, product.replace("Kartdata", "")))
+			if recent:  # Visibility already in cache
+				continue
+		if product == "Stedsnavn" and use_wfs:
+			filter_value, url = get_wfs_query(municipality_id)
+		else:
+			filename, url = get_filename(municipality_id, product)
+		urls.append(url)
+
+	for url in urls:
+		if url not in downloads:
+			downloads[ url ] = executor.submit(download_file, url)
+
+
+
+def prefetch_municipalities(municipality_ids, threads=download_threads):
+	'''
+	Iterate municipality ids, while files for the next municipalities are downloaded in the background.
+	Files for the current municipality and the next municipalities (as many as threads) are queued for download,
+	and at most one download per thread is in progress at a time.
+	'''
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+		for index, municipality_id in enumerate(municipality_ids):
+			for next_id in municipality_ids[ index : index + threads + 1 ]:
+				prefetch(executor, next_id)
+			yield municipality_id
+
+	downloads.clear()
+
+
+
 def get_municipality (parameter):
 	'''
 	Identify municipality name, unless more than one hit
@@ -237,20 +632,13 @@ def get_municipality (parameter):
 		return parameter
 
 	else:
-		parameter = parameter
-		found_id = ""
-		duplicate = False
-		for mun_id, mun_name in iter(municipalities.items()):
-			if parameter.lower() == mun_name.lower():
-				return mun_id
-			elif parameter.lower() in mun_name.lower():
-				if found_id:
-					duplicate = True
-				else:
-					found_id = mun_id
+		name = parameter.lower()
+		if name in municipality_names:
+			return municipality_names[ name ][0]
 
-		if found_id and not duplicate:
-			return found_id
+		found_ids = [ mun_id for mun_name, mun_ids in municipality_names.items() if name in mun_name for mun_id in mun_ids ]
+		if len(found_ids) == 1:
+			return found_ids[0]
 		else:
 			return parameter
 
@@ -262,9 +650,7 @@ def load_municipalities():
 	'''
 
 	url = "https://ws.geonorge.no/kommuneinfo/v1/fylkerkommuner?filtrer=fylkesnummer%2Cfylkesnavn%2Ckommuner.kommunenummer%2Ckommuner.kommunenavnNorsk"
-	file = urllib.request.urlopen(url)
-	data = json.load(file)
-	file.close()
+	data = load_cached_json(url, "municipalities.json")
 
 	municipalities['00'] = "Norge"
 	for county in data:
@@ -272,6 +658,11 @@ def load_municipalities():
 			municipalities[ municipality['kommunenummer'] ] = municipality['kommunenavnNorsk']
 		municipalities[ county['fylkesnummer'] ] = county['fylkesnavn']
 
+	# Index of lowercase names for get_municipality(). Some municipality names are used in more than one county.
+
+	for mun_id, mun_name in municipalities.items():
+		municipality_names.setdefault(mun_name.lower(), []).append(mun_id)
+
 
 
 def load_tagging():
@@ -281,14 +672,12 @@ def load_tagging():
 	'''
 
 	url = "https://raw.githubusercontent.com/NKAmapper/ssr2osm/main/navnetyper_tagged.json"
-	file = urllib.request.urlopen(url)
-	data = json.load(file)
-	file.close()
+	data = load_cached_json(url, "navnetyper_tagged.json")
 
 	for main_group in data['navnetypeHovedgrupper']:
 		for group in main_group['navnetypeGrupper']:
 			for name_type in group['navnetyper']:
-				tagging[ name_type['navn'] ] = name_type['tags']
+				tagging[ sys.intern(name_type['navn']) ] = name_type['tags']  # Same string object as interned place types
 
 				if "fixme" in name_type['tags']:
 					tagging[ name_type['navn'] ]['FIXME'] = name_type['tags']['fixme']
@@ -301,6 +690,15 @@ def load_tagging():
 
 
 
+def visibility_cache_filename(municipality_id, scale):
+	'''
+	Return filename of cached N50/N100 visibility codes for municipality or county.
+	'''
+
+	return "visibility_%s_%s.json" % (scale, municipality_id)
+
+
+
 def load_n50_n100 (municipality_id):
 	'''
 	Load visibility priority for place names from N50.
@@ -317,14 +715,19 @@ def load_n50_n100 (municipality_id):
 
 		message ("\tLoading %s data from Kartverket ... " % scale)
 
-		# Load latest N50 file for municipality from Kartverket
+		# Use visibility codes parsed recently, if any
 
-		filename = clean_filename("Basisdata_%s_%s_25833_%sKartdata_GML" % (municipality_id, municipalities[municipality_id], scale))
-		url = "https://nedlasting.geonorge.no/geonorge/Basisdata/%sKartdata/GML/%s.zip" % (scale, filename)
+		cache_path, recent = get_cache_path(visibility_cache_filename(municipality_id, scale))
+		if recent:
+			with open(cache_path, "rb") as file:
+				visibility[ scale ] = decode_json(file.read())
+			message ("%i places found\n" % len(visibility[ scale ]))
+			continue
+
+		# Load latest N50 file for municipality from Kartverket
 
-		request = urllib.request.Request(url, headers=header)
-		file_in = urllib.request.urlopen(request)
-		zip_file = zipfile.ZipFile(BytesIO(file_in.read()))
+		filename, url = get_filename(municipality_id, scale + "Kartdata")
+		zip_file = load_zip(url)
 
 		filename2 = filename.replace("Kartdata", "Stedsnavn")
 		try:
@@ -333,34 +736,28 @@ def load_n50_n100 (municipality_id):
 			message ("\t*** %s not found\n" % scale)
 			continue
 
-		tree = ET.parse(file)
-		file.close()
-		file_in.close()
-		root = tree.getroot()
-
-		ns_gml = "http://www.opengis.net/gml/3.2"
 		if scale == "N50":
 			ns_app = "https://skjema.geonorge.no/SOSI/produktspesifikasjon/N50/20230401"
 		else:
 			ns_app = "https://skjema.geonorge.no/SOSI/produktspesifikasjon/N100/20230401"
 
-		ns = {
-			'gml': ns_gml,
-			'app': ns_app
-		}
+		tag = qualified_tags({'app': ns_app}, ["app:stedsnummer", "app:tekstformatering/app:Tekstformatering/app:skriftkode"])
 
 		count = 0
 
-		# Loop place names and store visibility code in dict.
+		# Loop place names while parsing and store visibility code in dict.
 
-		for place in root.findall(".//app:StedsnavnTekst", ns):
-			place_id = place.find("app:stedsnummer", ns)
+		for place in iterate_features(file, "{%s}StedsnavnTekst" % ns_app):
+			place_id = place.find(tag['stedsnummer'])
 			if place_id is not None:
 				place_id = place_id.text
-				text_code = place.find("app:tekstformatering/app:Tekstformatering/app:skriftkode", ns).text
-				visibility[ scale ][ int(place_id) ] = int(text_code)
+				text_code = place.find(tag['skriftkode']).text
+				visibility[ scale ][ place_id ] = int(text_code)
 				count += 1
 
+		file.close()
+		save_cache(cache_path, json.dumps(visibility[ scale ]).encode("utf-8"))
+
 		message ("%i places found\n" % count)
 
 
@@ -378,6 +775,31 @@ def add_fixme(tags, comment):
 
 
 
+@functools.lru_cache(maxsize=64)
+def split_language_priority(language_priority):
+	'''
+	Split language priority, e.g. "norsk-nordsamisk", into tuple of languages.
+	Only a few combinations exist, so the result is cached.
+	'''
+
+	return tuple(language_priority.split("-"))
+
+
+
+@functools.lru_cache(maxsize=64)
+def get_name_tags(language, language_suffix):
+	'''
+	Return tuple of name tags for language in order of name_tag_types, e.g. "alt_name:se" for "nordsamisk" with suffix.
+	Only a few languages exist, so the result is cached and the same tag strings are reused for all places.
+	'''
+
+	if language_suffix:
+		return tuple(name_tag_type + ':' + language_codes[language] for name_tag_type in name_tag_types)
+	else:
+		return name_tag_types
+
+
+
 def generate_tags(tags, names, language_priority):
 
 	'''
@@ -387,33 +809,37 @@ def generate_tags(tags, names, language_priority):
 
 	main_name = []
 	extra_main_name = []
+	multiple_languages = (len(names) > 1)
 
 	if language_priority is None:
-		language_priority = "-".join(names.keys())
+		languages = names.keys()
+	else:
+		languages = split_language_priority(language_priority)
 
 	# Convert spellings to name tags.
 	# Iterate once per language in language priority order.	
 
-	for language in language_priority.split("-"):
+	for language in languages:
 		if language in names:
 
-			# Ensure only one main name, keep the longest ("Vestre Berg" before "Berg")
-			if len(names[ language ]['name']) > 1:
-				names[ language ]['name'].sort(key=len, reverse=True)
-				extra_main_name.extend(names[ language ]['name'][1:] )
-				names[ language ]['alt_name'] = names[ language ]['name'][1:] + names[ language ]['alt_name']
-				names[ language ]['name'] = [ names[ language ]['name'][0] ]
+			spellings = names[ language ]
+			if not any(spellings):
+				continue
 
-			for name_tag_type in ['name', 'alt_name', 'loc_name', 'old_name']:
-				if names[ language ][ name_tag_type ]:
+			# Ensure only one main name, keep the longest ("Vestre Berg" before "Berg")
+			if len(spellings[ NAME ]) > 1:
+				spellings[ NAME ].sort(key=len, reverse=True)
+				extra_main_name.extend(spellings[ NAME ][1:] )
+				spellings[ ALT_NAME ] = spellings[ NAME ][1:] + spellings[ ALT_NAME ]
+				spellings[ NAME ] = [ spellings[ NAME ][0] ]
 
-					name_tag = name_tag_type
-					if len(names) > 1 or language not in ["norsk", "nor"]:  # Language suffix for non-Norwegian names
-						name_tag += ':' + language_codes[language]
-					tags[ name_tag ] = ";".join(names[ language ][ name_tag_type ])
+			language_suffix = multiple_languages or language not in ("norsk", "nor")  # Language suffix for non-Norwegian names
+			for name_tag, tag_spellings in zip(get_name_tags(language, language_suffix), spellings):
+				if tag_spellings:
+					tags[ name_tag ] = ";".join(tag_spellings)
 
-			if names[ language ]['name']:
-				main_name.append(";".join(names[ language ]['name']))  # Promote to main name=* tag
+			if spellings[ NAME ]:
+				main_name.append(";".join(spellings[ NAME ]))  # Promote to main name=* tag
 
 	if main_name:
 		tags['name'] = " - ".join(main_name)
@@ -424,15 +850,17 @@ def generate_tags(tags, names, language_priority):
 
 	# Override place tag if higher visibility from N50 or N100
 
-	int_id = int(tags['ssr:stedsnr'])
+	place_id = tags['ssr:stedsnr']
 
 	code = None
-	if int_id in visibility['N50']:
-		code = visibility['N50'][ int_id ]
+	n50_code = visibility['N50'].get(place_id)
+	if n50_code is not None:
+		code = n50_code
 		tags['N50'] = str(code)
 
-	if int_id in visibility['N100']:
-		code = visibility['N100'][ int_id ]
+	n100_code = visibility['N100'].get(place_id)
+	if n100_code is not None:
+		code = n100_code
 		tags['N100'] = str(code)
 
 	if code and tags['HOVEDGRUPPE'] == "bebyggelse" and "place" in tags:
@@ -456,7 +884,7 @@ def generate_tags(tags, names, language_priority):
 
 		elif tags['place'] in ["farm", "isolated_dwelling"]:
 
-			if int_id in visibility['N100'] and int_id in visibility['N50'] and visibility['N50'][ int_id ] < 122:  # Both N100 and N50
+			if n100_code is not None and n50_code is not None and n50_code < 122:  # Both N100 and N50
 				tags['FIXME'] = "Sjekk endring fra place=%s (N100/N50)" % tags['place']
 				tags['place'] = "hamlet"
 
@@ -498,7 +926,7 @@ def process_ssr(municipality_id):
 	'''
 	Main function of ssr2osm.
 	Load municipality or county SSR file and convert to OSM tagging.
-	Converted place names are added to "places" list.
+	Converted place names are appended to "places" list, which is cleared by the caller.
 	Switch to SSR wfs query function if selected, otherwise load xlm file at Kartverket.
 	'''
 
@@ -524,19 +952,23 @@ def process_ssr(municipality_id):
 		'app': ns_app
 	}
 
-	filename = clean_filename("Basisdata_%s_%s_25833_Stedsnavn_GML" % (municipality_id, municipality_name))
+	tag = qualified_tags(ns, [
+		"app:navneobjekttype", "app:stedsnummer", "app:navneobjekthovedgruppe", "app:navneobjektgruppe", "app:sortering",
+		"app:språkprioritering", "app:kommune/app:Kommune/app:kommunenummer",
+		"app:multipunkt", "gml:MultiPoint/gml:pointMember", "app:posisjon", "app:senterlinje", "app:område",
+		"app:stedsnavn", "app:offentligBruk", "app:navnestatus", "app:språk",
+		"app:skrivemåte", "app:annenSkrivemåte", "app:komplettskrivemåte", "app:skrivemåtestatus"
+	])
+
+	geometry_tags = { tag['multipunkt'], tag['posisjon'], tag['senterlinje'], tag['område'] }
+	placename_tag = tag['stedsnavn']
+
+	filename, url = get_filename(municipality_id, "Stedsnavn")
 	message ("\tLoading file '%s' ... " % filename)
 
-	request = urllib.request.Request("https://nedlasting.geonorge.no/geonorge/Basisdata/Stedsnavn/GML/" + filename + ".zip", headers=header)
-	file_in = urllib.request.urlopen(request)
-	zip_file = zipfile.ZipFile(BytesIO(file_in.read()))
+	zip_file = load_zip(url)
 	file = zip_file.open(filename + ".gml")
 
-	tree = ET.parse(file)
-	file.close()
-	file_in.close()
-	root = tree.getroot()
-
 	# Loop features, parse, load into data structure and tag
 
 	message ("\n")
@@ -545,37 +977,49 @@ def process_ssr(municipality_id):
 	count_hits = 0
 	count_language_hits = 0
 	count_extra_main_names = 0
-	points = set()  # Used to discover overlapping points
+	points = {}  # Used to discover overlapping points
 
-	if not type_filter:  # Accumulate place names across municipalities/counties if name type filter is used
-		places.clear()
-		placeids.clear()
-
-	for feature in root:
-		
-		if "featureMember" not in feature.tag:
-			continue
+	for feature in iterate_features(file, "{%s}featureMember" % ns_gml):
 
 		count += 1
-		place_type = feature[0].find("app:navneobjekttype", ns).text
-		place_id = feature[0].find("app:stedsnummer", ns).text
+		element = feature[0]  # Place name object
+		place_type = element.findtext(tag['navneobjekttype'])
 
-		if type_filter and place_type != type_filter:  # Skip if name filter is used and does not match
+		if type_filter and place_type != type_filter:  # Skip if name filter is used and does not match, before any other lookup
 			continue
 
-		if int(place_id) in placeids:  # Skip if duplicate place
+		place_type = sys.intern(place_type)  # Share string between places with same value
+
+		# Collect first element of each tag, non-empty geometry elements and place names in one pass through the feature
+
+		fields = {}
+		geometry = {}
+		placenames = []
+		for child in element:
+			child_tag = child.tag
+			if child_tag == placename_tag:
+				placenames.append(child)
+			elif child_tag in geometry_tags:
+				if len(child) and child_tag not in geometry:
+					geometry[ child_tag ] = child
+			elif child_tag not in fields:
+				fields[ child_tag ] = child
+
+		place_id = fields[ tag['stedsnummer'] ].text
+
+		if place_id in placeids:  # Skip if duplicate place
 			continue
 
-		placeids.add( int(place_id) )
+		placeids.add(place_id)
 
 #		place_date = (feature[0].find("app:oppdateringsdato", ns).text)[:10]  # Not used
-		place_maingroup = feature[0].find("app:navneobjekthovedgruppe", ns).text
-		place_group = feature[0].find("app:navneobjektgruppe", ns).text
-		place_sorting = feature[0].find("app:sortering", ns).text  # Not used
+		place_maingroup = sys.intern(fields[ tag['navneobjekthovedgruppe'] ].text)
+		place_group = sys.intern(fields[ tag['navneobjektgruppe'] ].text)
+		place_sorting = fields[ tag['sortering'] ].text  # Not used
 
-		place_language_priority = feature[0].find("app:språkprioritering", ns)
+		place_language_priority = fields.get(tag['språkprioritering'])
 		if place_language_priority is not None:
-			place_language_priority = feature[0].find("app:språkprioritering", ns).text
+			place_language_priority = place_language_priority.text
 
 		tags = {
 			'ssr:stedsnr': place_id,
@@ -587,7 +1031,7 @@ def process_ssr(municipality_id):
 		}
 
 		if len(municipality_id) == 2:
-			place_municipality = feature[0].find("app:kommune/app:Kommune/app:kommunenummer", ns)
+			place_municipality = element.find(tag['kommunenummer'])
 			if place_municipality is not None:
 				place_municipality = place_municipality.text
 				tags['KOMMUNE'] = "#" + place_municipality + " " + municipalities[ place_municipality ]
@@ -596,64 +1040,64 @@ def process_ssr(municipality_id):
 
 		additional_coordinates = []
 
-		if feature[0].find("app:multipunkt", ns):
-			place_coordinate = parse_coordinates(feature[0].find("app:multipunkt", ns)[0][0][0][0].text)[0]  # Use 1st point
-			for point_member in feature[0].findall("app:multipunkt/gml:MultiPoint/gml:pointMember", ns):
+		if tag['multipunkt'] in geometry:
+			multipoint = geometry[ tag['multipunkt'] ]
+			place_coordinate = parse_coordinates(multipoint[0][0][0][0].text)[0]  # Use 1st point
+			for point_member in multipoint.findall(tag['pointMember']):
 				additional_coordinates.append(parse_coordinates(point_member[0][0].text)[0])
 
-		elif feature[0].find("app:posisjon", ns):
-			place_coordinate = parse_coordinates(feature[0].find("app:posisjon", ns)[0][0].text)[0]
+		elif tag['posisjon'] in geometry:
+			place_coordinate = parse_coordinates(geometry[ tag['posisjon'] ][0][0].text)[0]
 
-		elif feature[0].find("app:senterlinje", ns):
-			place_coordinate = average_point(parse_coordinates(feature[0].find("app:senterlinje", ns)[0][0].text))
-			additional_coordinates = parse_coordinates(feature[0].find("app:senterlinje", ns)[0][0].text)
+		elif tag['senterlinje'] in geometry:
+			additional_coordinates = parse_coordinates(geometry[ tag['senterlinje'] ][0][0].text)
+			place_coordinate = average_point(additional_coordinates)
 
-		elif feature[0].find("app:område", ns):
-			place_coordinate = average_point(parse_coordinates(feature[0].find("app:område", ns)[0][0][0][0][0][0].text))
+		elif tag['område'] in geometry:
+			place_coordinate = average_point(parse_coordinates(geometry[ tag['område'] ][0][0][0][0][0][0].text))
 
 		else:
 			place_coordinate = (0,0, 0.0)
 
 		# Adjust coordinate slightly to avoid exact overlap (JOSM will merge overlapping nodes)
 
-		place_coordinate = ( round(place_coordinate[0], 7), round(place_coordinate[1], 7) )
-		while place_coordinate in points:
-			place_coordinate = ( place_coordinate[0], place_coordinate[1] + 0.001)
-		points.add(place_coordinate)
+		place_coordinate = avoid_overlap(place_coordinate, points, 0.001)
+
+		# Skip name parsing if place will not be stored anyway (after avoid_overlap, which must see all places)
+
+		if not tagging[ place_type ] and not include_incomplete_names:
+			continue
 
 		# Get all spellings/languages for the place
 
 		names = {}
 
-		for placename in feature[0].findall("app:stedsnavn", ns):
+		for placename in placenames:
 
-			public_placename =  (placename[0].find("app:offentligBruk", ns).text == "true")
-#			case_status = placename[0].find("app:navnesakstatus", ns).text  # Not used
-			name_status = placename[0].find("app:navnestatus", ns).text
-			language = placename[0].find("app:språk", ns).text
+			placename = placename[0]
+			public_placename =  (placename.findtext(tag['offentligBruk']) == "true")
+#			case_status = placename.find("app:navnesakstatus", ns).text  # Not used
+			name_status = placename.findtext(tag['navnestatus'])
+			language = sys.intern(placename.findtext(tag['språk']))  # Repeated for most names
 
 			if language not in names:
-				names[ language ] = {
-					'name': [],
-					'alt_name': [],
-					'loc_name': [],
-					'old_name': []
-				}
+				names[ language ] = [ [], [], [], [] ]  # Spellings for name, alt_name, loc_name, old_name
 
-			for spelling in chain( placename[0].findall("app:skrivemåte", ns), placename[0].findall("app:annenSkrivemåte", ns) ):
+			for spelling in chain( placename.findall(tag['skrivemåte']), placename.findall(tag['annenSkrivemåte']) ):
 
-				spelling_name = " ".join((spelling[0].find("app:komplettskrivemåte", ns).text).split())  # Fix spaces
-				spelling_status = spelling[0].find("app:skrivemåtestatus", ns).text
-				priority_spelling = ("skrivemåte" in spelling.tag)
+				priority_spelling = (spelling.tag == tag['skrivemåte'])
+				spelling = spelling[0]
+				spelling_name = fix_spaces(spelling.findtext(tag['komplettskrivemåte']))
+				spelling_status = spelling.findtext(tag['skrivemåtestatus'])
 
 				if name_status == "historisk" or spelling_status == "historisk":
-					names[ language ]['old_name'].append(spelling_name)
+					names[ language ][ OLD_NAME ].append(spelling_name)
 				elif spelling_status in ['foreslått', 'uvurdert']:
-					names[ language ]['loc_name'].append(spelling_name)
+					names[ language ][ LOC_NAME ].append(spelling_name)
 				elif public_placename and name_status != "undernavn" and priority_spelling:
-					names[ language ]['name'].append(spelling_name)
+					names[ language ][ NAME ].append(spelling_name)
 				else:
-					names[ language ]['alt_name'].append(spelling_name)
+					names[ language ][ ALT_NAME ].append(spelling_name)
 
 		# Get name tags and OSM feature tags
 
@@ -685,16 +1129,23 @@ def process_ssr(municipality_id):
 			if include_all_river_points and place_type in ["elv", "elvesving", "bekk", "grøft"] and additional_coordinates:
 				for additional_coordinate in additional_coordinates:
 
-					extra_point = ( round(additional_coordinate[0], 7), round(additional_coordinate[1], 7) )
-					while extra_point in points:
-						extra_point = ( extra_point[0], extra_point[1] + 0.001)
-					points.add(extra_point)
+					extra_point = avoid_overlap(additional_coordinate, points, 0.001)
 
-					extra_feature = copy.deepcopy(new_feature)
-					extra_feature['properties']['EXTRA'] = "yes"
-					extra_feature['geometry']['coordinates'] = extra_point
+					extra_tags = tags.copy()  # Tag values are strings, so a shallow copy is sufficient
+					extra_tags['EXTRA'] = "yes"
+
+					extra_feature = {
+						'type': 'Feature',
+						'geometry': {
+							'type': 'Point',
+							'coordinates': extra_point
+						},
+						'properties': extra_tags
+					}
 					places.append(extra_feature)
 
+	file.close()
+
 	message ("\tConverted %i of %i place names" % (count_hits, count))
 	if count_language_hits > 0:
 		message (", including %i non-Norwegian names" % count_language_hits)
@@ -736,29 +1187,24 @@ def process_ssr_wfs(municipality_id):
 		'app': ns_app
 	}
 
-	if type_filter:
-		filter_parameter = ("app:navneobjekttype", type_filter)
-	elif len(municipality_id) == 4: 
-		filter_parameter = ("app:kommune/app:Kommune/app:kommunenummer", municipality_id)
-	else:
-		filter_parameter = ("app:kommune/app:Kommune/app:fylkesnummer", municipality_id)
-
-	wfs_filter = '<Filter><PropertyIsEqualTo><ValueReference xmlns:app="%s">%s</ValueReference>' % (ns_app, filter_parameter[0]) + \
-					'<Literal>%s</Literal></PropertyIsEqualTo></Filter>' % filter_parameter[1]
+	tag = qualified_tags(ns, [
+		"app:stedstatus", "app:navneobjekttype", "app:navneobjekthovedgruppe", "app:navneobjektgruppe", "app:sortering",
+		"app:stedsnummer", "app:språkprioritering", "app:kommune/app:Kommune/app:kommunenummer", "app:posisjon",
+		"gml:MultiPoint", "gml:Point", "gml:LineString", "gml:MultiCurve", "gml:Polygon",
+		"app:stedsnavn", "app:navnestatus", "app:språk",
+		"app:skrivemåte", "app:langnavn", "app:skrivemåtestatus", "app:prioritertSkrivemåte"
+	])
 
-	url = "http://wfs.geonorge.no/skwms1/wfs.stedsnavn50?" + \
-			"VERSION=2.0.0&SERVICE=WFS&srsName=EPSG:4326&REQUEST=GetFeature&TYPENAME=Sted&resultType=results&Filter="
+	placename_tag = tag['stedsnavn']
 
-	header["Content-Type"] = "text/xml"
+	filter_value, url = get_wfs_query(municipality_id)
 
-	message ("\tLoading wfs for '%s' ... " % filter_parameter[1])
+	message ("\tLoading wfs for '%s' ... " % filter_value)
 
-	request = urllib.request.Request(url + urllib.parse.quote(wfs_filter), headers=header)
-	file = urllib.request.urlopen(request)
-
-	tree = ET.parse(file)
-	file.close()
-	root = tree.getroot()
+	if url in downloads:
+		file = downloads.pop(url).result()  # Prefetched
+	else:
+		file = request_url(url)  # Parse while downloading
 
 	# Loop features, parse, load into data structure and tag
 
@@ -767,26 +1213,42 @@ def process_ssr_wfs(municipality_id):
 	count = 0
 	count_hits = 0
 	count_language_hits = 0
-	points = set()  # Used to discover overlapping points
-	places.clear()
+	points = {}  # Used to discover overlapping points
 
-	for feature in root:
+	for feature in iterate_features(file, "{%s}member" % ns_wfs):
 
 		count += 1
-		place_status = feature[0].find("app:stedstatus", ns).text
-		place_type = feature[0].find("app:navneobjekttype", ns).text
+		element = feature[0]  # Place name object
+		place_type = element.findtext(tag['navneobjekttype'])
+
+		if type_filter and place_type != type_filter:  # Skip if name filter is used and does not match, before any other lookup
+			continue
+
+		place_status = element.findtext(tag['stedstatus'])
 
-		# Skip place under certain conditions
-		if place_status not in ["aktiv", "relikt"] or type_filter and place_type != type_filter:
+		if place_status not in ["aktiv", "relikt"]:  # Skip place with other status
 			continue
 
+		place_type = sys.intern(place_type)  # Share string between places with same value
+
+		# Collect first element of each tag and place names in one pass through the feature
+
+		fields = {}
+		placenames = []
+		for child in element:
+			child_tag = child.tag
+			if child_tag == placename_tag:
+				placenames.append(child)
+			elif child_tag not in fields:
+				fields[ child_tag ] = child
+
 #		place_date = (feature[0].find("app:oppdateringsdato", ns).text)[:10]  # Not used
-		place_maingroup = feature[0].find("app:navneobjekthovedgruppe", ns).text
-		place_group = feature[0].find("app:navneobjektgruppe", ns).text
-		place_sorting = feature[0].find("app:sortering", ns)[0][0].text
-		place_id = feature[0].find("app:stedsnummer", ns).text
+		place_maingroup = sys.intern(fields[ tag['navneobjekthovedgruppe'] ].text)
+		place_group = sys.intern(fields[ tag['navneobjektgruppe'] ].text)
+		place_sorting = fields[ tag['sortering'] ][0][0].text
+		place_id = fields[ tag['stedsnummer'] ].text
 
-		place_language_priority = feature[0].find("app:språkprioritering", ns)  # Not used at Svalbard
+		place_language_priority = fields.get(tag['språkprioritering'])  # Not used at Svalbard
 		if place_language_priority is not None:
 			place_language_priority = place_language_priority.text
 
@@ -800,27 +1262,29 @@ def process_ssr_wfs(municipality_id):
 		}
 
 		if len(municipality_id) == 2:
-			place_municipality = feature[0].find("app:kommune/app:Kommune/app:kommunenummer", ns)
+			place_municipality = element.find(tag['kommunenummer'])
 			if place_municipality is not None:
 				place_municipality = place_municipality.text
 				tags['KOMMUNE'] = "#" + place_municipality + " " + municipalities[ place_municipality ]
 
 		# Get coordinate
 
-		geometry = feature[0].find("app:posisjon", ns)
-		if geometry.find("gml:MultiPoint", ns):
+		geometry = fields[ tag['posisjon'] ]
+		geometry_type = geometry[0].tag if len(geometry) else None  # One geometry element
+
+		if geometry_type == tag['MultiPoint']:
 			place_coordinate = parse_coordinates(geometry[0][0][0][0].text)[0]  # Use 1st point
 
-		elif geometry.find("gml:Point", ns):
+		elif geometry_type == tag['Point']:
 			place_coordinate = parse_coordinates(geometry[0][0].text)[0]
 
-		elif geometry.find("gml:LineString", ns):
+		elif geometry_type == tag['LineString']:
 			place_coordinate = average_point(parse_coordinates(geometry[0][0].text))
 
-		elif geometry.find("gml:MultiCurve", ns):
+		elif geometry_type == tag['MultiCurve']:
 			place_coordinate = average_point(parse_coordinates(geometry[0][0][0][0].text))
 
-		elif geometry.find("gml:Polygon", ns):
+		elif geometry_type == tag['Polygon']:
 			place_coordinate = average_point(parse_coordinates(geometry[0][0][0][0].text))  # Exterior area only
 
 		else:
@@ -828,49 +1292,48 @@ def process_ssr_wfs(municipality_id):
 
 		# Adjust coordinate slightly to avoid exact overlap (JOSM will merge overlapping nodes)
 
-		place_coordinate = ( round(place_coordinate[0], 7), round(place_coordinate[1], 7) )
-		while place_coordinate in points:
-			place_coordinate = ( place_coordinate[0], place_coordinate[1] + 0.0001)
-		points.add(place_coordinate)
+		place_coordinate = avoid_overlap(place_coordinate, points, 0.0001)
+
+		# Skip name parsing if place will not be stored anyway (after avoid_overlap, which must see all places)
+
+		if not tagging[ place_type ] and not include_incomplete_names:
+			continue
 
 		# Get all spellings/languages for the place
 
 		names = {}
 		count_extra_main_names = 0
 
-		for placename in feature[0].findall("app:stedsnavn", ns):
+		for placename in placenames:
 
-#			case_status = placename[0].find("app:navnesakstatus", ns).text  # Not used
-			name_status = placename[0].find("app:navnestatus", ns).text
-			language = placename[0].find("app:språk", ns).text
+			placename = placename[0]
+#			case_status = placename.find("app:navnesakstatus", ns).text  # Not used
+			name_status = placename.findtext(tag['navnestatus'])
+			language = sys.intern(placename.findtext(tag['språk']))  # Repeated for most names
 
 			if name_status in ["feilført", "avslåttNavnevalg"]:
 				continue
 
 			if language not in names:
-				names[ language ] = {
-					'name': [],
-					'alt_name': [],
-					'loc_name': [],
-					'old_name': []
-				}
+				names[ language ] = [ [], [], [], [] ]  # Spellings for name, alt_name, loc_name, old_name
 
-			for spelling in placename[0].findall("app:skrivemåte", ns):
+			for spelling in placename.findall(tag['skrivemåte']):
 
-				spelling_name = " ".join((spelling[0].find("app:langnavn", ns).text).split())  # Fix spaces
-				spelling_status = spelling[0].find("app:skrivemåtestatus", ns).text
-				priority_spelling = (spelling[0].find("app:prioritertSkrivemåte", ns).text == "true")
+				spelling = spelling[0]
+				spelling_name = fix_spaces(spelling.findtext(tag['langnavn']))
+				spelling_status = spelling.findtext(tag['skrivemåtestatus'])
+				priority_spelling = (spelling.findtext(tag['prioritertSkrivemåte']) == "true")
 
 				if spelling_status not in ["avslått", "avslåttNavneledd", "feilført"]:
 
 					if name_status == "historisk" or spelling_status == "historisk":
-						names[ language ]['old_name'].append(spelling_name)
+						names[ language ][ OLD_NAME ].append(spelling_name)
 					elif spelling_status in ['foreslått', 'uvurdert']:
-						names[ language ]['loc_name'].append(spelling_name)
+						names[ language ][ LOC_NAME ].append(spelling_name)
 					elif name_status != "undernavn" and (priority_spelling or spelling_status == "vedtatt"):
-						names[ language ]['name'].append(spelling_name)
+						names[ language ][ NAME ].append(spelling_name)
 					else:
-						names[ language ]['alt_name'].append(spelling_name)
+						names[ language ][ ALT_NAME ].append(spelling_name)
 
 		# Get name tags and OSM feature tags
 
@@ -896,7 +1359,9 @@ def process_ssr_wfs(municipality_id):
 				count_language_hits += 1
 			if "FIXME" in tags and "likestilt" in tags['FIXME']:
 				count_extra_main_names += 1
-	
+
+	file.close()
+
 	check_duplicates()
 
 	if avoid_building and len(municipality_id) == 4:
@@ -916,13 +1381,13 @@ def sort_place(place):
 	'''
 	Generate sort key so that least important places are selected for removal.
 	'''
-	if place['properties']['place'] in place_order:
-		value = place_order.index(place['properties']['place'])
+	value = place_rank.get(place['properties']['place'])
+	if value is not None:
 		if "FIXME" in place['properties'] and place['properties']['place'] in ["locality", "isolated_dwelling", "farm"]:
 			if  "(N50)" in place['properties']['FIXME']:
-				value = place_order.index("neighbourhood") - 0.11
+				value = place_rank['neighbourhood'] - 0.11
 			elif "(N100)" in place['properties']['FIXME']:
-				value = place_order.index("neighbourhood") - 0.10
+				value = place_rank['neighbourhood'] - 0.10
 		else:
 			if place['properties']['TYPE'] == "navnegard":
 				value += 0.2
@@ -945,9 +1410,6 @@ def check_duplicates():
 	Discover close duplicate names among "bebyggelse" places and tag in fixme.
 	'''
 
-	global place_order
-	place_order  = ['locality', 'square', 'isolated_dwelling', 'farm', 'neighbourhood', 'hamlet', 'quarter', 'suburb', 'village', 'town', 'city']
-
 	count = 0
 	place_names = {}
 
@@ -967,10 +1429,17 @@ def check_duplicates():
 		if len(duplicates) > 1:
 			duplicates.sort(key = sort_place)
 
+			# Pairs too far apart in latitude or longitude alone are skipped before computing distance
+			max_delta = duplicate_tolerance / (6371000.0 * radians_per_degree) * 1.000001  # Degrees, with margin for rounding
+			min_cos = math.cos(max(abs(place['geometry']['coordinates'][1]) for place in duplicates) * radians_per_degree)  # Smallest longitude scale
+
 			while len(duplicates) > 1:
 				ref_point = duplicates.pop()['geometry']['coordinates']
 				for place in duplicates:
-					distance = compute_distance(ref_point, place['geometry']['coordinates'])
+					point = place['geometry']['coordinates']
+					if abs(point[1] - ref_point[1]) > max_delta or abs(point[0] - ref_point[0]) * min_cos > max_delta:  # Too far apart
+						continue
+					distance = compute_distance(ref_point, point)
 					if distance < duplicate_tolerance:
 						add_fixme(place['properties'], "Fjern duplikat")
 						place['properties']['DUPLIKAT'] = str(int(distance))
@@ -1000,19 +1469,33 @@ def check_building_overlap(municipality_id):
 			message("*** File '%s'not found\n" % filename)
 			return
 
-	file = open(filename)
-	building_data = json.load(file)
+	file = open(filename, "rb")
+	building_data = decode_json(file.read())
 	file.close()
 
-	buildings = [building for building in building_data['features'] if building['geometry']['type'] == "Polygon"]
+	# Store outer ring of each building polygon with its bbox, (min_lon, min_lat, max_lon, max_lat, ring),
+	# to speed up overlap test later. Also index buildings in grid cells by bbox.
 
-	# Add polygon bbox to speed up overlap test later
+	grid_size = 0.002  # Degrees, about the size of the margin box around each place (200 m north-south)
+	building_grid = {}  # Index of buildings within each grid cell
+	buildings = []
 
-	for building in buildings:
-		building['min_bbox'] = (min([ node[0] for node in building['geometry']['coordinates'][0] ]), \
-								min([ node[1] for node in building['geometry']['coordinates'][0] ]))
-		building['max_bbox'] = (max([ node[0] for node in building['geometry']['coordinates'][0] ]), \
-								max([ node[1] for node in building['geometry']['coordinates'][0] ]))
+	for building in building_data['features']:
+		if building['geometry']['type'] != "Polygon":
+			continue
+
+		ring = building['geometry']['coordinates'][0]
+		if len(ring[0]) > 2:  # Positions with a third (z) value; keep (lon, lat) for inside_polygon()
+			ring = [ (node[0], node[1]) for node in ring ]
+		longitudes = list(map(itemgetter(0), ring))
+		latitudes = list(map(itemgetter(1), ring))
+		min_lon, min_lat, max_lon, max_lat = min(longitudes), min(latitudes), max(longitudes), max(latitudes)
+
+		for x in range(int(min_lon // grid_size), int(max_lon // grid_size) + 1):
+			for y in range(int(min_lat // grid_size), int(max_lat // grid_size) + 1):
+				building_grid.setdefault((x, y), []).append(len(buildings))
+
+		buildings.append((min_lon, min_lat, max_lon, max_lat, ring))
 
 	margin_overlap = 100  # meters
 	relocate_step = 2  # meters
@@ -1028,23 +1511,28 @@ def check_building_overlap(municipality_id):
 		min_bbox = coordinate_offset(node, - margin_overlap)
 		max_bbox = coordinate_offset(node, + margin_overlap) 
 
-		# Identify buildings in vicinity of place name
+		# Identify buildings in vicinity of place name, only testing buildings in nearby grid cells
+
+		candidates = set()
+		for x in range(int(min_bbox[0] // grid_size), int(max_bbox[0] // grid_size) + 1):
+			for y in range(int(min_bbox[1] // grid_size), int(max_bbox[1] // grid_size) + 1):
+				candidates.update(building_grid.get((x, y), []))
 
 		target_buildings = []
-		for building in buildings:
-			if min_bbox[0] < building['max_bbox'][0] and max_bbox[0] > building['min_bbox'][0] and \
-					min_bbox[1] < building['max_bbox'][1] and max_bbox[1] > building['min_bbox'][1]:
-				target_buildings.append(building)
+		for i in sorted(candidates):  # Keep order of building file
+			min_lon, min_lat, max_lon, max_lat, ring = buildings[i]
+			if min_bbox[0] < max_lon and max_bbox[0] > min_lon and min_bbox[1] < max_lat and max_bbox[1] > min_lat:
+				target_buildings.append(buildings[i])
 
 		# Relocate place name slightly until outside of buildings
 
 		if target_buildings:
 			inside = True
 			while inside:
-				for building in target_buildings:
-					inside = inside_polygon(node, building['geometry']['coordinates'][0])
+				for min_lon, min_lat, max_lon, max_lat, ring in target_buildings:
+					inside = min_lat < node[1] <= max_lat and node[0] <= max_lon and inside_polygon(node, ring)  # Bbox test first
 					if inside:
-						node = coordinate_offset(building['min_bbox'], - random.uniform(relocate_step, 2 * relocate_step))
+						node = coordinate_offset((min_lon, min_lat), - random.uniform(relocate_step, 2 * relocate_step))
 						break
 
 			if place['geometry']['coordinates'] != node:
@@ -1059,6 +1547,24 @@ def check_building_overlap(municipality_id):
 
 
 
+def encode_feature(feature):
+	'''
+	Encode geojson feature as utf-8 json, indented or compact.
+	'''
+
+	if pretty_output:
+		if orjson:
+			return orjson.dumps(feature, option=orjson.OPT_INDENT_2)
+		else:
+			return json.dumps(feature, indent=2, ensure_ascii=False).encode("utf-8")
+	else:
+		if orjson:
+			return orjson.dumps(feature)
+		else:
+			return json.dumps(feature, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+
 def output_geojson(municipality_id):
 	'''
 	Save places dict to geosjon file.
@@ -1076,13 +1582,27 @@ def output_geojson(municipality_id):
 
 		message ("\tSave to '%s' file ... " % filename)
 
-		geojson_features = { 
-			'type': 'FeatureCollection',
-			'features': places
-		}
+		# Write one feature at a time to avoid building the complete file in memory.
+		# Pretty layout is identical to json.dump of the whole FeatureCollection with indent=2.
+
+		file = open(filename, "wb")
+
+		if pretty_output:
+			file.write(b'{\n  "type": "FeatureCollection",\n  "features": [\n')
+			for index, feature in enumerate(places):
+				if index > 0:
+					file.write(b",\n")
+				file.write(b"    " + encode_feature(feature).replace(b"\n", b"\n    "))
+			file.write(b"\n  ]\n}")
+
+		else:
+			file.write(b'{"type":"FeatureCollection","features":[\n')
+			for index, feature in enumerate(places):
+				if index > 0:
+					file.write(b",\n")
+				file.write(encode_feature(feature))
+			file.write(b"\n]}\n")
 
-		file = open(filename, "w")
-		json.dump(geojson_features, file, indent=2, ensure_ascii=False)
 		file.close()
 
 		message ("%i place names saved\n\n" % len(places))
@@ -1092,6 +1612,48 @@ def output_geojson(municipality_id):
 
 
 
+def convert_municipality(municipality_id):
+	'''
+	Convert place names for one municipality and save to file, when processing "Norge".
+	'''
+
+	lap_time = time.time()
+	places.clear()
+	placeids.clear()
+	process_ssr(municipality_id)
+	output_geojson(municipality_id)
+	if use_wfs:
+		used_time = time.time() - lap_time
+		message("\tDone in %s\n" % timeformat(used_time))
+
+
+
+def init_process():
+	'''
+	Initialize worker process. Open http connections are inherited from the main process and can not be shared.
+	'''
+
+	connection_pool.connections = {}
+
+
+
+def convert_municipality_process(municipality_ids):
+	'''
+	Run convert_municipality() in worker process for a batch of municipalities,
+	while files for the next municipality of the batch are downloaded in one background thread.
+	Each worker thus has at most one download in progress.
+	Console messages are returned, so that the main process can output them in order of municipalities.
+	'''
+
+	output = StringIO()
+	with contextlib.redirect_stdout(output):
+		for municipality_id in prefetch_municipalities(municipality_ids, threads=1):
+			convert_municipality(municipality_id)
+
+	return output.getvalue()
+
+
+
 # Main program
 
 if __name__ == '__main__':
@@ -1102,7 +1664,9 @@ if __name__ == '__main__':
 	places = []          # Will contain converted place names
 	tagging = {}         # OSM tagging for each name type
 	municipalities = {}  # Codes/names of all counties and municipalities
+	municipality_names = {}  # Codes for each lowercase municipality/county name
 	placeids = set()     # Will contain all place id's (stedsnr)
+	downloads = {}       # Background downloads in progress, per url
 	visibility = {       # Place id's (stedsnr) for high visibility in N50 and N100
 		'N100': {},
 		'N50': {}
@@ -1112,6 +1676,7 @@ if __name__ == '__main__':
 
 	if "-wfs" in sys.argv:
 		use_wfs = True
+		header["Content-Type"] = "text/xml"
 		municipalities['2100'] = "Svalbard"
 
 	if len(sys.argv) < 2:
@@ -1124,6 +1689,9 @@ if __name__ == '__main__':
 	if "-extra" in sys.argv:
 		less_tags = False
 
+	if "-pretty" in sys.argv:
+		pretty_output = True
+
 	load_municipalities()
 	municipality_id = get_municipality(sys.argv[1])
 	if municipality_id is None or municipality_id not in municipalities:
@@ -1146,6 +1714,14 @@ if __name__ == '__main__':
 	if "-allpoints" in sys.argv:
 		include_all_river_points = True  # Include extra instances for each river/stream coordinate in SSR
 
+	if "-parallel" in sys.argv:
+		if "fork" not in multiprocessing.get_all_start_methods():  # Worker processes rely on fork to inherit data
+			message ("*** Parallel processes not supported on this platform\n\n")
+		elif hasattr(os, "sched_getaffinity"):
+			parallel_processes = min(len(os.sched_getaffinity(0)), max_parallel_processes)  # Cpus available to this process
+		else:
+			parallel_processes = min(os.cpu_count() or 1, max_parallel_processes)
+
 	# Execute conversion
 
 	if municipality_name == "Norge":
@@ -1157,28 +1733,32 @@ if __name__ == '__main__':
 				output_geojson("00")  # Norge				
 
 			else:
-				# Process all counties before output
-				for municipality_id in sorted(list(municipalities.keys())):
-					if len(municipality_id) == 2 and municipality_id != "00":
-						process_ssr(municipality_id)
+				# Process all counties before output, accumulating place names
+				county_ids = [ mun_id for mun_id in sorted(municipalities.keys()) if len(mun_id) == 2 and mun_id != "00" ]
+				for municipality_id in prefetch_municipalities(county_ids):
+					process_ssr(municipality_id)
 
 				message ("Compiling Norway file for name type '%s'\n" % type_filter)
 				output_geojson("00")  # Norge
 
 		else:
 			# Output all municipalities separately
-			for municipality_id in sorted(list(municipalities.keys())):
-				if len(municipality_id) == 4:
+			municipality_ids = [ mun_id for mun_id in sorted(municipalities.keys()) if len(mun_id) == 4 and mun_id >= "" ]  # Adjust if need to restart
+
+			if parallel_processes > 1:
+				# Worker processes are forked to inherit municipalities, tagging and settings.
+				# Each worker gets small batches, so that downloads may overlap conversion within the worker.
+				batches = [ municipality_ids[ index : index + download_threads ]
+								for index in range(0, len(municipality_ids), download_threads) ]
+				context = multiprocessing.get_context("fork")
+				with concurrent.futures.ProcessPoolExecutor(max_workers=parallel_processes, mp_context=context,
+																initializer=init_process) as executor:
+					for output in executor.map(convert_municipality_process, batches):
+						message(output)
 
-					if municipality_id < "":  # Skip if need to restart
-						continue
-
-					lap_time = time.time()
-					process_ssr(municipality_id)
-					output_geojson(municipality_id)
-					if use_wfs:
-						used_time = time.time() - lap_time
-						message("\tDone in %s\n" % timeformat(used_time))
+			else:
+				for municipality_id in prefetch_municipalities(municipality_ids):
+					convert_municipality(municipality_id)
 
 	else:
 		# Output one municipality or county
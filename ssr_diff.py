@@ -39,20 +39,13 @@ def get_municipality (parameter):
 		return parameter
 
 	else:
-		parameter = parameter
-		found_id = ""
-		duplicate = False
-		for mun_id, mun_name in iter(municipalities.items()):
-			if parameter.lower() == mun_name.lower():
-				return mun_id
-			elif parameter.lower() in mun_name.lower():
-				if found_id:
-					duplicate = True
-				else:
-					found_id = mun_id
-
-		if found_id and not duplicate:
-			return found_id
+		name = parameter.lower()
+		if name in municipality_names:
+			return municipality_names[ name ][0]
+
+		found_ids = [ mun_id for mun_name, mun_ids in municipality_names.items() if name in mun_name for mun_id in mun_ids ]
+		if len(found_ids) == 1:
+			return found_ids[0]
 		else:
 			return parameter
 
@@ -72,6 +65,11 @@ def load_municipalities():
 		for municipality in county['kommuner']:
 			municipalities[ municipality['kommunenummer'] ] = municipality['kommunenavnNorsk']
 
+	# Index of lowercase names for get_municipality(). Some municipality names are used in more than one county.
+
+	for mun_id, mun_name in municipalities.items():
+		municipality_names.setdefault(mun_name.lower(), []).append(mun_id)
+
 
 
 def get_names(tags):
@@ -80,12 +78,11 @@ def get_names(tags):
 	'''
 
 	names = {}
-	for key, value in iter(tags.items()):
+	for key, value in tags.items():
 		if "name" in key:
-			value_split = value.split(" - ")
-			for i in range(len(value_split)):
-				value_split[i] = ";".join(sorted(value_split[i].split(";")))
-			names[key] = " - ".join(value_split)
+			if ";" in value:  # Only values with several names need sorting
+				value = " - ".join(";".join(sorted(part.split(";"))) for part in value.split(" - "))
+			names[key] = value
 	return names
 
 
@@ -99,6 +96,7 @@ if __name__ == '__main__':
 	# Get municipality
 
 	municipalities = {}
+	municipality_names = {}  # Codes for each lowercase municipality name
 	load_municipalities()
 
 	municipality_id = get_municipality(sys.argv[1])
@@ -123,11 +121,12 @@ if __name__ == '__main__':
 	request = urllib.request.Request(url, headers=header)
 	file = urllib.request.urlopen(request)
 
-	tree = ET.parse(file)
-	file.close()
-	root = tree.getroot()
+	# Parse nodes while downloading, and clear each node when done to keep memory low
+
+	for event, node in ET.iterparse(file, events=("end",)):
+		if node.tag != "node":
+			continue
 
-	for node in root.iter('node'):
 		entry = {
 			'coordinate': (float(node.get('lon')), float(node.get('lat'))),
 			'tags': {}
@@ -137,6 +136,9 @@ if __name__ == '__main__':
 				entry['tags'][ tag.get('k') ] = tag.get('v').replace("  ", " ")
 
 		places2[ entry['tags']['ssr:stedsnr'] ] = entry
+		node.clear()
+
+	file.close()
 
 	print ("File 2: %s ... %i place names" % (url, len(places2)))
 
@@ -146,21 +148,23 @@ if __name__ == '__main__':
 
 	places1_not_found = []  # Will contain non-matched places from file 1
 
-	for place1 in places1['features'][:]:
+	for place1 in places1['features']:
 		place_id = place1['properties']['ssr:stedsnr']
 		found = False
 
-		if place_id in places2:
-			names1 = set(get_names(place1['properties']).items())
-			names2 = set(get_names(places2[ place_id ]['tags']).items())
-			if names2 - names1:
-				print ("%s: Missing tags in file 1: %s" % (place_id, dict(sorted(names2 - names1))))
-				found = True
-			if names1 - names2:
-				print ("%s: Missing tags in file 2: %s" % (place_id, dict(sorted(names1 - names2))))
-				found = True
-
-			del places2[ place_id ]  # Places2 will only contain non-matched places from file 2
+		place2 = places2.pop(place_id, None)  # Places2 will only contain non-matched places from file 2
+		if place2 is not None:
+			names1 = get_names(place1['properties']).items()
+			names2 = get_names(place2['tags']).items()
+			if names1 != names2:  # Only compute differences when names differ
+				missing1 = names2 - names1
+				missing2 = names1 - names2
+				if missing1:
+					print ("%s: Missing tags in file 1: %s" % (place_id, dict(sorted(missing1))))
+					found = True
+				if missing2:
+					print ("%s: Missing tags in file 2: %s" % (place_id, dict(sorted(missing2))))
+					found = True
 
 		else:
 			places1_not_found.append(place1)
@@ -30,6 +30,39 @@ sm_EccSquared = 6.69437999013e-03
 UTMScaleFactor = 0.9996
 
 
+# Series constants depending only on the ellipsoid, precalculated once
+#   instead of for every converted point.
+
+# Precalculate n (Eq. 10.18)
+sm_n = (sm_a - sm_b) / (sm_a + sm_b)
+
+# Precalculate alpha, beta, gamma, delta and epsilon (Eq. 10.17)
+arc_alpha = ((sm_a + sm_b) / 2.0) \
+    * (1.0 + (math.pow (sm_n, 2.0) / 4.0) + (math.pow (sm_n, 4.0) / 64.0))
+arc_beta = (-3.0 * sm_n / 2.0) + (9.0 * math.pow (sm_n, 3.0) / 16.0) \
+    + (-3.0 * math.pow (sm_n, 5.0) / 32.0)
+arc_gamma = (15.0 * math.pow (sm_n, 2.0) / 16.0) \
+    + (-15.0 * math.pow (sm_n, 4.0) / 32.0)
+arc_delta = (-35.0 * math.pow (sm_n, 3.0) / 48.0) \
+    + (105.0 * math.pow (sm_n, 5.0) / 256.0)
+arc_epsilon = (315.0 * math.pow (sm_n, 4.0) / 512.0)
+
+# Precalculate alpha_, beta_, gamma_, delta_ and epsilon_ (Eq. 10.22)
+#   (alpha_ same as alpha in Eq. 10.17)
+foot_alpha = ((sm_a + sm_b) / 2.0) \
+    * (1 + (math.pow (sm_n, 2.0) / 4) + (math.pow (sm_n, 4.0) / 64))
+foot_beta = (3.0 * sm_n / 2.0) + (-27.0 * math.pow (sm_n, 3.0) / 32.0) \
+    + (269.0 * math.pow (sm_n, 5.0) / 512.0)
+foot_gamma = (21.0 * math.pow (sm_n, 2.0) / 16.0) \
+    + (-55.0 * math.pow (sm_n, 4.0) / 32.0)
+foot_delta = (151.0 * math.pow (sm_n, 3.0) / 96.0) \
+    + (-417.0 * math.pow (sm_n, 5.0) / 128.0)
+foot_epsilon = (1097.0 * math.pow (sm_n, 4.0) / 512.0)
+
+# Precalculate ep2, the second eccentricity squared
+sm_ep2 = (math.pow (sm_a, 2.0) - math.pow (sm_b, 2.0)) / math.pow (sm_b, 2.0)
+
+
 def DegToFloat(degrees, minutes, seconds):
     '''
     Converts angle in format deg,min,sec to a floating point number
@@ -73,34 +106,12 @@ def ArcLengthOfMeridian(phi):
     The ellipsoidal distance of the point from the equator, in meters.
     '''
  
-    # Precalculate n
-    n = (sm_a - sm_b) / (sm_a + sm_b)
- 
-    # Precalculate alpha
-    alpha = ((sm_a + sm_b) / 2.0) \
-        * (1.0 + (math.pow (n, 2.0) / 4.0) + (math.pow (n, 4.0) / 64.0))
- 
-    # Precalculate beta
-    beta = (-3.0 * n / 2.0) + (9.0 * math.pow (n, 3.0) / 16.0) \
-        + (-3.0 * math.pow (n, 5.0) / 32.0)
- 
-    # Precalculate gamma
-    gamma = (15.0 * math.pow (n, 2.0) / 16.0) \
-        + (-15.0 * math.pow (n, 4.0) / 32.0)
- 
-    # Precalculate delta
-    delta = (-35.0 * math.pow (n, 3.0) / 48.0) \
-        + (105.0 * math.pow (n, 5.0) / 256.0)
- 
-    # Precalculate epsilon
-    epsilon = (315.0 * math.pow (n, 4.0) / 512.0)
- 
-    # Now calculate the sum of the series and return
-    result = alpha \
-        * (phi + (beta * math.sin (2.0 * phi)) \
-           + (gamma * math.sin (4.0 * phi)) \
-           + (delta * math.sin (6.0 * phi)) \
-           + (epsilon * math.sin (8.0 * phi)))
+    # Calculate the sum of the series and return
+    result = arc_alpha \
+        * (phi + (arc_beta * math.sin (2.0 * phi)) \
+           + (arc_gamma * math.sin (4.0 * phi)) \
+           + (arc_delta * math.sin (6.0 * phi)) \
+           + (arc_epsilon * math.sin (8.0 * phi)))
  
     return result
 
@@ -135,37 +146,14 @@ def FootpointLatitude(y):
     The footpoint latitude, in radians.
     '''
  
-    # Precalculate n (Eq. 10.18)
-    n = (sm_a - sm_b) / (sm_a + sm_b)
- 
-    # Precalculate alpha_ (Eq. 10.22)
-    # (Same as alpha in Eq. 10.17)
-    alpha_ = ((sm_a + sm_b) / 2.0) \
-        * (1 + (math.pow (n, 2.0) / 4) + (math.pow (n, 4.0) / 64))
- 
     # Precalculate y_ (Eq. 10.23)
-    y_ = y / alpha_
- 
-    # Precalculate beta_ (Eq. 10.22)
-    beta_ = (3.0 * n / 2.0) + (-27.0 * math.pow (n, 3.0) / 32.0) \
-        + (269.0 * math.pow (n, 5.0) / 512.0)
- 
-    # Precalculate gamma_ (Eq. 10.22)
-    gamma_ = (21.0 * math.pow (n, 2.0) / 16.0) \
-        + (-55.0 * math.pow (n, 4.0) / 32.0)
- 
-    # Precalculate delta_ (Eq. 10.22)
-    delta_ = (151.0 * math.pow (n, 3.0) / 96.0) \
-        + (-417.0 * math.pow (n, 5.0) / 128.0)
+    y_ = y / foot_alpha
  
-    # Precalculate epsilon_ (Eq. 10.22)
-    epsilon_ = (1097.0 * math.pow (n, 4.0) / 512.0)
- 
-    # Now calculate the sum of the series (Eq. 10.21)
-    result = y_ + (beta_ * math.sin (2.0 * y_)) \
-        + (gamma_ * math.sin (4.0 * y_)) \
-        + (delta_ * math.sin (6.0 * y_)) \
-        + (epsilon_ * math.sin (8.0 * y_))
+    # Calculate the sum of the series (Eq. 10.21)
+    result = y_ + (foot_beta * math.sin (2.0 * y_)) \
+        + (foot_gamma * math.sin (4.0 * y_)) \
+        + (foot_delta * math.sin (6.0 * y_)) \
+        + (foot_epsilon * math.sin (8.0 * y_))
  
     return result
 
@@ -189,11 +177,8 @@ def MapLatLonToXY(phi, lambda_pt, lambda_ctr):
     of the computed point.
     '''
  
-    # Precalculate ep2
-    ep2 = (math.pow (sm_a, 2.0) - math.pow (sm_b, 2.0)) / math.pow (sm_b, 2.0)
- 
     # Precalculate nu2
-    nu2 = ep2 * math.pow (math.cos (phi), 2.0)
+    nu2 = sm_ep2 * math.pow (math.cos (phi), 2.0)
  
     # Precalculate N
     N = math.pow (sm_a, 2.0) / (sm_b * math.sqrt (1 + nu2))
@@ -271,15 +256,11 @@ def MapXYToLatLon(x, y, lambda_ctr):
     # Get the value of phif, the footpoint latitude.
     phif = FootpointLatitude (y)
  
-    # Precalculate ep2
-    ep2 = (math.pow (sm_a, 2.0) - math.pow (sm_b, 2.0)) \
-        / math.pow (sm_b, 2.0)
- 
     # Precalculate cos (phif)
     cf = math.cos (phif)
  
     # Precalculate nuf2
-    nuf2 = ep2 * math.pow (cf, 2.0)
+    nuf2 = sm_ep2 * math.pow (cf, 2.0)
  
     # Precalculate Nf and initialize Nfpow
     Nf = math.pow (sm_a, 2.0) / (sm_b * math.sqrt (1 + nuf2))
@@ -477,4 +458,48 @@ def UtmToLatLon(x, y, zone, hemi):
     latlon[0] = RadToDeg(latlon[0])
     latlon[1] = RadToDeg(latlon[1])
  
-    return latlon
\ No newline at end of file
+    return latlon
+
+
+def UtmListToLonLat(points, zone, hemi):
+    '''
+    Converts a list of UTM coordinates to lon lat, e.g. all points of a line.
+    The zone and hemisphere are checked once, and the central meridian
+    is computed once, for all points.
+ 
+    Inputs:
+    points - iterable of (easting, northing) pairs (in meters)
+    zone - UTM zone
+    hemi - 'N' or 'S'
+ 
+    Outputs:
+    lonlat - list of (longitude, latitude) tuples (in degrees)
+ 
+    Raises ValueError for invalid zone or hemisphere.
+    '''
+    if ((zone < 1) or (60 < zone)):
+        raise ValueError ('UTM zone out of range [1, 60]: %s' % zone)
+ 
+    if ((hemi != 'N') and (hemi != 'S')):
+        raise ValueError ('UTM hemisphere must be N or S: %s' % hemi)
+ 
+    southhemi = (hemi == 'S')
+    cmeridian = UTMCentralMeridian(zone)
+ 
+    lonlat = []
+    for x, y in points:
+        # Same steps as UTMXYToLatLon
+        x -= 500000.0
+        x /= UTMScaleFactor
+ 
+        if (southhemi):
+            y -= 10000000.0
+ 
+        y /= UTMScaleFactor
+ 
+        latlon = MapXYToLatLon(x, y, cmeridian)
+ 
+        # Convert to degrees
+        lonlat.append((RadToDeg(latlon[1]), RadToDeg(latlon[0])))
+ 
+    return lonlat